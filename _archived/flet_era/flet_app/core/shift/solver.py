@@ -1,19 +1,151 @@
 # シフト生成ソルバー — シフト作成ツール
 
 import random
+import time
+
 import numpy as np
 import pandas as pd
 
+try:
+    from numba import njit, prange
+except ImportError:
+    # numbaが無い環境ではNumPyベクトル実装にフォールバックする
+    njit = None
+
 from flet_app.core.shift.utils import (
     is_holiday,
     get_role_map_from_df,
+    get_role_vectors_from_df,
     can_cover_required_roles,
     get_possible_day_patterns,
     assign_roles_smartly,
+    pick_fallback_role,
     DEFAULT_ROLES_CONFIG,
 )
 
 
+if njit is not None:
+    # パス展開の内側ループをLLVMでネイティブコンパイルするカーネル。
+    # ビーム全体(B)×パターン(P)の全子候補をフラットなSoAテンソルへ書き出す。
+    # 子kごとに互いに素な行へ書くだけなのでprangeで全コアへ分配できる。
+    # 日単位の定数はすべて引数のスカラーとして渡し、ループ不変量として
+    # fastmathの再結合・SIMD化を効かせる（NaN/Infはペナルティ設計上現れない）。
+    # ペナルティ計算の意味はexpand_paths内のNumPyフォールバックと同一に保つこと。
+    @njit(cache=True, parallel=True, fastmath=True)
+    def _expand_day_kernel(
+        cons, offs, off_cons, weekend_offs, scores,
+        W, pat_bits, must_bits, base_penalty, surplus_staff,
+        max_cons_limits, req_offs, weekend_off_target, special_rest,
+        expected_offs, is_weekend, strict, days_left, day_plus1, num_days,
+        behind_weight, future_min_needed, is_priority, late_month,
+        ok, out_scores, new_cons, new_offs, new_off_cons, new_weekend,
+    ):
+        # 出力テンソルは呼び出し側が使い回すスクラッチ領域（okはFalse初期化済み）。
+        # ok[k]=Falseの行は未定義値のままでよい（選抜で参照されない）
+        num_parents, num_staff = cons.shape
+        num_pats = W.shape[0]
+
+        for k in prange(num_parents * num_pats):
+            b = k // num_pats
+            p = k % num_pats
+            # 下界枝刈り：この親の「今日必ず休むべき」スタッフを出勤させる
+            # パターンは厳密チェックで必ず落ちるため、展開せずスキップする
+            if pat_bits[p] & must_bits[b]:
+                continue
+            pen = base_penalty[p]
+            violated = False
+            missing = False
+            behind = 0.0
+            ahead = 0.0
+            total_capacity = 0
+
+            for s in range(num_staff):
+                if W[p, s]:
+                    nc = cons[b, s] + 1
+                    no = offs[b, s]
+                    noc = 0
+                    nw = weekend_offs[b, s]
+                    over = nc - max_cons_limits[s]
+                    if over >= 2:
+                        if strict:
+                            violated = True
+                            break
+                        pen += 100000.0
+                    elif over == 1:
+                        pen += 1000.0
+                    elif nc == max_cons_limits[s]:
+                        pen += 50.0
+                else:
+                    nc = 0
+                    no = offs[b, s] + 1
+                    noc = off_cons[b, s] + 1
+                    nw = weekend_offs[b, s]
+                    if is_weekend and weekend_off_target[s]:
+                        nw += 1
+                        if nw > 1:
+                            pen += 20000.0
+                    if noc >= 3:
+                        pen += 100.0
+                        if special_rest[s]:
+                            pen += 200.0
+
+                if no + days_left < req_offs[s]:
+                    if strict:
+                        violated = True
+                        break
+                    missing = True
+
+                diff = no - expected_offs[s]
+                if diff < 0.0:
+                    behind -= diff
+                else:
+                    ahead += diff
+
+                capacity = (num_days - req_offs[s]) - (day_plus1 - no)
+                if capacity > 0:
+                    total_capacity += capacity
+
+                new_cons[k, s] = nc
+                new_offs[k, s] = no
+                new_off_cons[k, s] = noc
+                new_weekend[k, s] = nw
+
+            if violated:
+                continue
+            if missing:
+                pen += 10000000.0
+
+            pen += behind * behind_weight + ahead * 2000.0
+
+            if total_capacity > 0:
+                tightness = future_min_needed / total_capacity
+            else:
+                tightness = 2.0
+
+            if is_priority:
+                weight = 0.0
+            elif late_month:
+                weight = 10000.0
+            elif tightness > 1.0:
+                weight = 5000.0
+            elif tightness > 0.9:
+                weight = 1000.0
+            else:
+                weight = 500.0
+            pen += surplus_staff[p] * weight
+
+            ok[k] = True
+            out_scores[k] = scores[b] + pen
+else:
+    _expand_day_kernel = None
+
+
+# 反復ビーム拡幅の設定：基準幅での1本目が終わったあと、この時間予算内で
+# 幅を倍々に広げて再探索する（上限は基準幅の4倍）
+WIDEN_TIME_BUDGET = 1.5
+WIDEN_MAX_FACTOR = 4
+
+
 def _select_beam_width(num_staff: int, num_days: int) -> int:
     """探索の広さを、月間シフトでも待ち時間が膨らみすぎない値へ調整する。"""
     complexity = max(1, num_staff) * max(1, num_days)
@@ -138,25 +270,98 @@ def solve_schedule_from_ui(
     for idx in range(num_days - 1, -1, -1):
         future_needed_suffix[idx] = future_needed_suffix[idx + 1] + daily_body_targets[idx]
 
-    req_offs = req_offs.tolist()
-    initial_cons = initial_cons.tolist()
-    max_cons_limits = max_cons_limits.tolist()
-    is_seishain = is_seishain.tolist()
-    morning_capable = [("Morning" in role_map[s]) for s in range(num_staff)]
-    night_capable = [("Night" in role_map[s]) for s in range(num_staff)]
-    special_rest_penalty_staff = [
-        ("Neko" in role_map[s] and "C" in role_map[s] and "A" not in role_map[s])
-        for s in range(num_staff)
-    ]
+    # スタッフ軸の制約チェックはNumPyのベクトル演算で行うため、配列のまま保持する
+    req_offs = np.asarray(req_offs, dtype=np.int64)
+    initial_cons = np.asarray(initial_cons, dtype=np.int64)
+    max_cons_limits = np.asarray(max_cons_limits, dtype=np.int64)
+    is_seishain = np.asarray(is_seishain, dtype=np.bool_)
+    # 役割セットのハッシュ検索を繰り返さないよう、メンバーシップは
+    # utils側で一度だけスタッフ軸のブール配列（SoA表現）へ落とし込む。
+    # 未定義キーは全員Falseのベクトルを返す（旧来のセット検索と同じ扱い）
+    role_vectors = get_role_vectors_from_df(staff_df, roles_config=roles_config)
+    _no_capability = np.zeros(num_staff, dtype=np.bool_)
+
+    def _capability_vector(key):
+        return role_vectors.get(key, _no_capability)
+
+    morning_capable = _capability_vector("Morning")
+    night_capable = _capability_vector("Night")
+    special_rest_penalty_staff = (
+        _capability_vector("Neko") & _capability_vector("C") & ~_capability_vector("A")
+    )
+    # 希望休でない（＝休んでも希望休扱いにならない）マスク
+    not_fixed_off = (fixed_shifts != '×')
     staff_indices = tuple(range(num_staff))
 
+    # スタッフ集合をuint64ビットマスクで表現する（スタッフsがビットs）。
+    # パターン×能力の人数カウントがAND+popcountの1演算になる（64人超は非対応）
+    use_bitmasks = num_staff <= 64
+    if use_bitmasks:
+        bit_weights = np.uint64(1) << np.arange(num_staff, dtype=np.uint64)
+        morning_bits = bit_weights[morning_capable].sum(dtype=np.uint64)
+        night_bits = bit_weights[night_capable].sum(dtype=np.uint64)
+
+    BEAM_WIDTH = _select_beam_width(num_staff, num_days)
+    valid_pattern_limit, invalid_pattern_limit, fallback_pattern_limit = _select_pattern_limits(
+        num_staff,
+        num_days,
+    )
+    # 列挙段階の上限：日次フィルタで使う数の数倍あれば十分で、
+    # スタッフ数が多い日のC(n,k)爆発をここで断つ
+    enumeration_cap = fallback_pattern_limit * 5
+
+    # 役割カバー判定はパターン内容だけで決まる純関数なので、
+    # 同じパターンが別の日に再登場しても1回だけ計算すればよい
+    cover_cache = {}
+
+    def cached_can_cover(pat_tuple):
+        if pat_tuple not in cover_cache:
+            cover_cache[pat_tuple] = can_cover_required_roles(
+                pat_tuple, role_map, constraints, roles_config=roles_config
+            )
+        return cover_cache[pat_tuple]
+
+    # 役割カバー判定の一括版。can_cover_required_rolesと同じ3段階の判定
+    # （総人数下限→朝/夜人数→Hallの定理）を、1日分のパターン全件に対して
+    # 「役割部分集合（2^R-1通り）×ベクトルpopcount」で一括評価する。
+    # 判定結果は1パターンずつ呼ぶ場合と完全に一致する
+    use_batch_cover = use_bitmasks and len(roles_config) <= 10
+    if use_batch_cover:
+        cover_min_staff = sum(r.get("min_per_day", 1) for r in roles_config)
+        role_bits = np.array(
+            [bit_weights[_capability_vector(r["name"])].sum(dtype=np.uint64)
+             for r in roles_config],
+            dtype=np.uint64,
+        )
+        role_needs = np.array(
+            [r.get("min_per_day", 1) for r in roles_config], dtype=np.int64
+        )
+        subset_ids = np.arange(1, 1 << len(roles_config), dtype=np.int64)
+        subset_members = (subset_ids[:, np.newaxis] >> np.arange(len(roles_config))) & 1
+        subset_bits = np.bitwise_or.reduce(
+            np.where(subset_members.astype(np.bool_), role_bits, np.uint64(0)), axis=1
+        )
+        subset_needs = subset_members @ role_needs
+
+        def batch_can_cover(pattern_masks, sizes, morning_counts, night_counts):
+            valid = (sizes >= cover_min_staff)
+            valid &= (night_counts >= min_n) & (morning_counts >= min_m)
+            for sbits, sneed in zip(subset_bits, subset_needs):
+                valid &= np.bitwise_count(pattern_masks & sbits) >= sneed
+            return valid
+
     # --- 日ごとの出勤パターン事前生成 ---
     day_patterns = []
     for d in range(num_days):
         avail = [s for s in range(num_staff) if fixed_shifts[s, d] != '×']
         # 出勤指定スタッフを必ず含むパターンのみにフィルタリング
         must_work = [s for s in range(num_staff) if required_work_flags[s, d]]
-        pats = get_possible_day_patterns(avail, roles_config=roles_config)
+        pats = get_possible_day_patterns(
+            avail,
+            roles_config=roles_config,
+            target_size=daily_body_targets[d],
+            max_patterns=enumeration_cap,
+        )
         if must_work:
             pats = [p for p in pats if all(s in p for s in must_work)]
             # フィルタ後にパターンがない場合はフィルタなしにフォールバック
@@ -164,35 +369,44 @@ def solve_schedule_from_ui(
                 pats = get_possible_day_patterns(avail)
         random.shuffle(pats)
 
-        pattern_infos = []
-        for pat in pats:
-            pat_tuple = tuple(pat)
-            work_flags = tuple(s in pat_tuple for s in staff_indices)
-            pattern_infos.append({
-                'staff': pat_tuple,
-                'work_flags': work_flags,
-                'valid_roles': can_cover_required_roles(
-                    pat_tuple,
-                    role_map,
-                    constraints,
-                    roles_config=roles_config,
-                ),
-                'morning_count': sum(morning_capable[s] for s in pat_tuple),
-                'night_count': sum(night_capable[s] for s in pat_tuple),
-                'size': len(pat_tuple),
-            })
-        day_patterns.append(pattern_infos)
-
-    # --- ビームサーチ初期状態 ---
-    current_paths = [{
-        'prev': None,
-        'pattern': None,
-        'cons': initial_cons.copy(),
-        'offs': [0] * num_staff,
-        'off_cons': [0] * num_staff,
-        'weekend_offs': [0] * num_staff,
-        'score': 0.0,
-    }]
+        # パターン特徴量（出勤行列・役割カバー・朝夜人数・人数）はここで一度だけ計算し、
+        # 展開時はインデックス参照だけで済むようテンソルとしてまとめておく
+        staff_tuples = [tuple(pat) for pat in pats]
+        num_pats = len(staff_tuples)
+        work_matrix = np.zeros((num_pats, num_staff), dtype=np.bool_)
+        for pi, pat_tuple in enumerate(staff_tuples):
+            work_matrix[pi, list(pat_tuple)] = True
+        if use_bitmasks:
+            pattern_masks = (work_matrix * bit_weights).sum(axis=1, dtype=np.uint64)
+            morning_counts = np.bitwise_count(pattern_masks & morning_bits).astype(np.int64)
+            night_counts = np.bitwise_count(pattern_masks & night_bits).astype(np.int64)
+            sizes = np.bitwise_count(pattern_masks).astype(np.int64)
+        else:
+            pattern_masks = None
+            morning_counts = work_matrix @ morning_capable.astype(np.int64)
+            night_counts = work_matrix @ night_capable.astype(np.int64)
+            sizes = work_matrix.sum(axis=1)
+        if use_batch_cover:
+            valid_roles = batch_can_cover(
+                pattern_masks, sizes, morning_counts, night_counts
+            )
+            # 復元フェーズのcached_can_coverがここでの結果を再利用できるようにする
+            for pat_tuple, ok_flag in zip(staff_tuples, valid_roles):
+                cover_cache[pat_tuple] = bool(ok_flag)
+        else:
+            valid_roles = np.fromiter(
+                (cached_can_cover(pat_tuple) for pat_tuple in staff_tuples),
+                dtype=np.bool_, count=num_pats,
+            )
+        day_patterns.append({
+            'staff_tuples': staff_tuples,
+            'work_matrix': work_matrix,
+            'masks': pattern_masks,
+            'valid_roles': valid_roles,
+            'morning_counts': morning_counts,
+            'night_counts': night_counts,
+            'sizes': sizes,
+        })
 
     # --- 進行状況コールバック ---
     if progress_callback:
@@ -200,203 +414,337 @@ def solve_schedule_from_ui(
         if should_continue is False:
             return None
 
-    BEAM_WIDTH = _select_beam_width(num_staff, num_days)
-    valid_pattern_limit, invalid_pattern_limit, fallback_pattern_limit = _select_pattern_limits(
-        num_staff,
-        num_days,
-    )
-
-    # === メインループ：日ごとにビームサーチ ===
-    for d in range(num_days):
-        if progress_callback:
-            should_continue = progress_callback(d + 1, num_days, f"📊 {d+1}/{num_days} 日目を計算中... (候補数: {len(current_paths)})")
-            if should_continue is False:
-                return None
-
-        is_weekend = is_weekend_day[d]
-        is_priority = is_priority_day[d]
-        patterns = day_patterns[d]
-        day_target = daily_targets_list[d]
-        target_m = day_target['朝目標']
-        target_n = day_target['夜目標']
-        target_total_bodies = daily_body_targets[d]
-        days_left = num_days - 1 - d
-        expected_ratio = (d + 1) / num_days
-        future_min_needed = future_needed_suffix[d + 1]
-
-        # パターンフィルタリング：有効/無効に分類
-        valid_pats = [pattern for pattern in patterns if pattern['valid_roles']]
-        invalid_pats = [pattern for pattern in patterns if not pattern['valid_roles']]
-        use_patterns = valid_pats[:valid_pattern_limit] + invalid_pats[:invalid_pattern_limit]
-        if len(use_patterns) < 50:
-            use_patterns = (valid_pats + invalid_pats)[:fallback_pattern_limit]
-
-        # --- パス展開関数 ---
-        def expand_paths(paths, patterns_to_use, strict_constraints=True):
-            """1日分のパスを展開し、スコア付きの新パスリストを返す"""
-            new_paths_local = []
-            for path in paths:
-                for pat in patterns_to_use:
-                    new_cons = path['cons'].copy()
-                    new_offs = path['offs'].copy()
-                    new_off_cons = path['off_cons'].copy()
-                    new_weekend_offs = path['weekend_offs'].copy()
-
-                    penalty = 0.0
-                    violation = False
-
-                    # 役割カバーチェック
-                    if not pat['valid_roles']:
-                        penalty += 50000
-
-                    work_flags = pat['work_flags']
-
-                    # --- スタッフごとの制約チェック ---
-                    for s in staff_indices:
-                        limit = max_cons_limits[s]
-                        if work_flags[s]:
-                            new_cons[s] += 1
-                            new_off_cons[s] = 0
-                            if new_cons[s] > limit:
-                                if new_cons[s] == limit + 1:
-                                    penalty += 1000
-                                else:
-                                    if strict_constraints:
-                                        violation = True
-                                        break
-                                    else:
-                                        penalty += 100000
-                            elif new_cons[s] == limit:
-                                penalty += 50
+    max_use_patterns = max(valid_pattern_limit + invalid_pattern_limit, fallback_pattern_limit)
+
+    def _run_beam(beam_width):
+        """指定ビーム幅で全日程を探索し、(最終スコア, 採用パターン列)を返す。
+
+        キャンセル要求があった場合はNoneを返す。日ごとのパターンテンソルや
+        ビットマスク等の事前計算は全ラン共通で、幅だけを変えて再利用する。
+        """
+        # --- ビームサーチ初期状態 ---
+        # 採用パターンの履歴はパスに持たせず、生き残ったパスだけを
+        # (親ノードID, 当日のパターン) のジャーナルに記録して最後に復元する
+        node_parents = []
+        node_patterns = []
+
+        # パスはdictのリストではなく、(ビーム幅, スタッフ数) のSoAテンソル一式で持つ。
+        # 行bがビーム内のパスbの状態で、展開・選抜を配列演算として一括処理できる
+        beam = {
+            'cons': initial_cons[np.newaxis, :].copy(),
+            'offs': np.zeros((1, num_staff), dtype=np.int64),
+            'off_cons': np.zeros((1, num_staff), dtype=np.int64),
+            'weekend_offs': np.zeros((1, num_staff), dtype=np.int64),
+            'scores': np.zeros(1, dtype=np.float64),
+            'nodes': np.full(1, -1, dtype=np.int64),
+        }
+
+        # 子候補テンソルはこのラン内の最大サイズで一度だけ確保し、
+        # 日ごとにスライスして使い回す（小配列の確保・解放の繰り返しを避ける）
+        max_children = beam_width * max_use_patterns
+        scratch_ok = np.zeros(max_children, dtype=np.bool_)
+        scratch_scores = np.empty(max_children, dtype=np.float64)
+        scratch_cons = np.empty((max_children, num_staff), dtype=np.int64)
+        scratch_offs = np.empty((max_children, num_staff), dtype=np.int64)
+        scratch_off_cons = np.empty((max_children, num_staff), dtype=np.int64)
+        scratch_weekend = np.empty((max_children, num_staff), dtype=np.int64)
+
+        # === メインループ：日ごとにビームサーチ ===
+        for d in range(num_days):
+            if progress_callback:
+                should_continue = progress_callback(d + 1, num_days, f"📊 {d+1}/{num_days} 日目を計算中... (ビーム幅: {beam_width}, 候補数: {len(beam['scores'])})")
+                if should_continue is False:
+                    return None
+
+            is_weekend = is_weekend_day[d]
+            is_priority = is_priority_day[d]
+            patterns = day_patterns[d]
+            day_target = daily_targets_list[d]
+            target_m = day_target['朝目標']
+            target_n = day_target['夜目標']
+            target_total_bodies = daily_body_targets[d]
+            days_left = num_days - 1 - d
+            expected_ratio = (d + 1) / num_days
+            future_min_needed = float(future_needed_suffix[d + 1])
+            late_month = d >= 20
+
+            # パターンフィルタリング：有効/無効に分類（インデックスで選択）
+            valid_idx = np.nonzero(patterns['valid_roles'])[0]
+            invalid_idx = np.nonzero(~patterns['valid_roles'])[0]
+            use_idx = np.concatenate([
+                valid_idx[:valid_pattern_limit],
+                invalid_idx[:invalid_pattern_limit],
+            ])
+            if len(use_idx) < 50:
+                use_idx = np.concatenate([valid_idx, invalid_idx])[:fallback_pattern_limit]
+
+            # 公休ペース計算用の期待値（日ごとに一定）
+            expected_offs = req_offs * expected_ratio
+            weekend_off_target = is_seishain & not_fixed_off[:, d]
+            behind_weight = 60000.0 if days_left < 8 else 10000.0
+
+            # --- パス展開関数 ---
+            def expand_paths(parent_beam, pattern_idx, strict_constraints=True):
+                """ビーム全体を1日分展開し、生き残った子のSoAテンソル一式を返す
+
+                numbaが利用できる場合はJITコンパイル済みカーネルで全親×全パターンを
+                一括展開し、そうでない場合は親ごとに(パターン数, スタッフ数)行列への
+                NumPy一括演算で計算して、フラットな子テンソルへ書き込む。
+                子が1つも生き残らない場合はNoneを返す。
+                """
+                num_pats = len(pattern_idx)
+                if num_pats == 0:
+                    return None
+
+                W = patterns['work_matrix'][pattern_idx]
+                rest = ~W
+                num_parents = len(parent_beam['scores'])
+                num_children = num_parents * num_pats
+
+                # 目標人数・役割カバーのペナルティ（パスに依存しないので先に合算）
+                base_penalty = np.where(patterns['valid_roles'][pattern_idx], 0.0, 50000.0)
+                base_penalty += 50 * np.maximum(target_m - patterns['morning_counts'][pattern_idx], 0)
+                base_penalty += 50 * np.maximum(target_n - patterns['night_counts'][pattern_idx], 0)
+                surplus_staff = np.maximum(patterns['sizes'][pattern_idx] - target_total_bodies, 0)
+
+                # 下界枝刈り：厳密モードでは「公休の残りが足りない」「連勤上限を既に
+                # 超過する」スタッフを含むパターンは必ず落ちるので、親ごとの
+                # 必須休みビットマスクとのANDだけで展開前に弾く（0なら枝刈り無効）
+                if strict_constraints and use_bitmasks:
+                    must_rest = (
+                        (parent_beam['offs'] + days_left < req_offs)
+                        | (parent_beam['cons'] >= max_cons_limits + 1)
+                    )
+                    must_bits = (must_rest * bit_weights).sum(axis=1, dtype=np.uint64)
+                    pat_bits = patterns['masks'][pattern_idx]
+                else:
+                    must_bits = np.zeros(num_parents, dtype=np.uint64)
+                    pat_bits = np.zeros(num_pats, dtype=np.uint64)
+
+                # スクラッチ領域を今回の子候補数分だけスライスして使う。
+                # okだけは前回の結果が残らないようFalseへ戻す
+                ok = scratch_ok[:num_children]
+                ok[:] = False
+                child_scores = scratch_scores[:num_children]
+                new_cons = scratch_cons[:num_children]
+                new_offs = scratch_offs[:num_children]
+                new_off_cons = scratch_off_cons[:num_children]
+                new_weekend_offs = scratch_weekend[:num_children]
+
+                if _expand_day_kernel is not None:
+                    _expand_day_kernel(
+                        parent_beam['cons'], parent_beam['offs'], parent_beam['off_cons'],
+                        parent_beam['weekend_offs'], parent_beam['scores'],
+                        W, pat_bits, must_bits, base_penalty, surplus_staff,
+                        max_cons_limits, req_offs, weekend_off_target, special_rest_penalty_staff,
+                        expected_offs, is_weekend, strict_constraints, days_left, d + 1, num_days,
+                        behind_weight, future_min_needed, is_priority, late_month,
+                        ok, child_scores, new_cons, new_offs, new_off_cons, new_weekend_offs,
+                    )
+                else:
+                    # 子kは親b=k//P, パターンp=k%P に対応（カーネルと同じフラット順）
+                    for b in range(num_parents):
+                        # 下界枝刈り：必須休みスタッフを含むパターン列を展開前に除外
+                        if must_bits[b]:
+                            cols = np.nonzero((pat_bits & must_bits[b]) == 0)[0]
+                            if cols.size == 0:
+                                continue
+                            dest = b * num_pats + cols
+                            Wb, restb = W[cols], rest[cols]
+                            penalty = base_penalty[cols].copy()
+                            surplus_b = surplus_staff[cols]
+                        else:
+                            dest = np.arange(b * num_pats, (b + 1) * num_pats)
+                            Wb, restb = W, rest
+                            penalty = base_penalty.copy()
+                            surplus_b = surplus_staff
+                        nb = len(penalty)
+
+                        # --- スタッフごとの制約チェック（全パターン一括） ---
+                        b_cons = np.where(Wb, parent_beam['cons'][b] + 1, 0)
+                        over = b_cons - max_cons_limits
+                        if strict_constraints:
+                            b_ok = ~np.any(over >= 2, axis=1)
+                            if not b_ok.any():
+                                continue
+                        else:
+                            b_ok = np.ones(nb, dtype=np.bool_)
+                            penalty += 100000 * np.count_nonzero(over >= 2, axis=1)
+                        penalty += 1000 * np.count_nonzero(over == 1, axis=1)
+                        penalty += 50 * np.count_nonzero(Wb & (b_cons == max_cons_limits), axis=1)
+
+                        b_offs = parent_beam['offs'][b] + restb
+                        b_off_cons = np.where(Wb, 0, parent_beam['off_cons'][b] + 1)
+
+                        if is_weekend:
+                            weekend_incr = restb & weekend_off_target
+                            b_weekend = parent_beam['weekend_offs'][b] + weekend_incr
+                            penalty += 20000 * np.count_nonzero(weekend_incr & (b_weekend > 1), axis=1)
+                        else:
+                            b_weekend = np.broadcast_to(parent_beam['weekend_offs'][b], (nb, num_staff))
+
+                        long_rest = b_off_cons >= 3
+                        penalty += 100 * np.count_nonzero(long_rest, axis=1)
+                        penalty += 200 * np.count_nonzero(long_rest & special_rest_penalty_staff, axis=1)
+
+                        # --- 公休数チェック ---
+                        missing = np.any(b_offs + days_left < req_offs, axis=1)
+                        if strict_constraints:
+                            b_ok &= ~missing
+                            if not b_ok.any():
+                                continue
                         else:
-                            new_cons[s] = 0
-                            new_offs[s] += 1
-                            new_off_cons[s] += 1
-                            if is_weekend and is_seishain[s]:
-                                if fixed_shifts[s, d] != '×':
-                                    new_weekend_offs[s] += 1
-                                    if new_weekend_offs[s] > 1:
-                                        penalty += 20000
-                            if new_off_cons[s] >= 3:
-                                penalty += 100
-                                if special_rest_penalty_staff[s]:
-                                    penalty += 200
-
-                    if violation:
-                        continue
-
-                    # --- 公休数チェック ---
-                    missing_required_offs = False
-                    if strict_constraints:
-                        for s in staff_indices:
-                            if new_offs[s] + days_left < req_offs[s]:
-                                missing_required_offs = True
-                                break
-                        if missing_required_offs:
-                            continue
-                    else:
-                        for s in staff_indices:
-                            if new_offs[s] + days_left < req_offs[s]:
-                                penalty += 10000000
-                                break
-
-                    # --- 公休ペースペナルティ ---
-                    total_remaining_capacity = 0
-                    for s in staff_indices:
-                        expected = req_offs[s] * expected_ratio
-                        diff = new_offs[s] - expected
-                        if diff < 0:
-                            penalty += (-diff) * 10000
-                            if days_left < 8:
-                                penalty += (-diff) * 50000
+                            penalty += 10000000 * missing
+
+                        # --- 公休ペースペナルティ ---
+                        diff = b_offs - expected_offs
+                        behind = np.where(diff < 0, -diff, 0.0).sum(axis=1)
+                        ahead = np.where(diff > 0, diff, 0.0).sum(axis=1)
+                        penalty += behind * behind_weight
+                        penalty += ahead * 2000
+
+                        remaining_capacity = (num_days - req_offs) - ((d + 1) - b_offs)
+                        total_remaining_capacity = np.where(
+                            remaining_capacity > 0, remaining_capacity, 0
+                        ).sum(axis=1)
+                        tightness = np.divide(
+                            future_min_needed,
+                            total_remaining_capacity,
+                            out=np.full(nb, 2.0),
+                            where=total_remaining_capacity > 0,
+                        )
+
+                        # 適応的ペナルティ重み（優先曜日・月末は日単位で上書き）
+                        if is_priority:
+                            surplus_weight = np.zeros(nb)
+                        elif late_month:
+                            surplus_weight = np.full(nb, 10000.0)
                         else:
-                            penalty += diff * 2000
-
-                        worked_days = (d + 1) - new_offs[s]
-                        remaining_capacity = (num_days - req_offs[s]) - worked_days
-                        if remaining_capacity > 0:
-                            total_remaining_capacity += remaining_capacity
-
-                    if total_remaining_capacity > 0:
-                        tightness = future_min_needed / total_remaining_capacity
-                    else:
-                        tightness = 2.0
-
-                    # 適応的ペナルティ重み
-                    surplus_penalty_weight = 500
-                    if tightness > 0.9:
-                        surplus_penalty_weight = 1000
-                    if tightness > 1.0:
-                        surplus_penalty_weight = 5000
-
-                    # --- 優先曜日ロジック ---
-                    if is_priority:
-                        surplus_penalty_weight = 0
-                    else:
-                        if d >= 20:
-                            surplus_penalty_weight = 10000
-
-                    # --- 目標人数ペナルティ ---
-                    c_m = pat['morning_count']
-                    c_n = pat['night_count']
-
-                    if c_m < target_m:
-                        penalty += (target_m - c_m) * 50
-                    if c_n < target_n:
-                        penalty += (target_n - c_n) * 50
-
-                    surplus_staff = max(0, pat['size'] - target_total_bodies)
-                    penalty += surplus_staff * surplus_penalty_weight
-
-                    new_paths_local.append({
-                        'prev': path,
-                        'pattern': pat['staff'],
-                        'cons': new_cons,
-                        'offs': new_offs,
-                        'off_cons': new_off_cons, 'weekend_offs': new_weekend_offs,
-                        'score': path['score'] + penalty
-                    })
-            return new_paths_local
-
-        # --- パス展開の実行 ---
-        # 1. 厳密制約で試行
-        next_paths = expand_paths(current_paths, use_patterns, strict_constraints=True)
-
-        # 2. フォールバック：制約緩和
-        if not next_paths:
-            next_paths = expand_paths(current_paths, patterns[:fallback_pattern_limit], strict_constraints=False)
-
-        # 3. 最終フォールバック：全員休み
-        if not next_paths:
-            for path in current_paths:
-                new_cons = [0] * num_staff
-                new_offs = [value + 1 for value in path['offs']]
-                new_off_cons = [value + 1 for value in path['off_cons']]
-                next_paths.append({
-                    'prev': path,
-                    'pattern': tuple(),
-                    'cons': new_cons,
-                    'offs': new_offs,
-                    'off_cons': new_off_cons, 'weekend_offs': path['weekend_offs'],
-                    'score': path['score'] + 1000000
-                })
-
-        next_paths.sort(key=lambda x: x['score'])
-        current_paths = next_paths[:BEAM_WIDTH]
+                            surplus_weight = np.where(
+                                tightness > 1.0, 5000.0,
+                                np.where(tightness > 0.9, 1000.0, 500.0),
+                            )
+                        penalty += surplus_b * surplus_weight
+
+                        ok[dest] = b_ok
+                        child_scores[dest] = parent_beam['scores'][b] + penalty
+                        new_cons[dest] = b_cons
+                        new_offs[dest] = b_offs
+                        new_off_cons[dest] = b_off_cons
+                        new_weekend_offs[dest] = b_weekend
+
+                keep = np.nonzero(ok)[0]
+                if keep.size == 0:
+                    return None
+                return {
+                    'cons': new_cons[keep],
+                    'offs': new_offs[keep],
+                    'off_cons': new_off_cons[keep],
+                    'weekend_offs': new_weekend_offs[keep],
+                    'scores': child_scores[keep],
+                    'parents': parent_beam['nodes'][keep // num_pats],
+                    'patterns': pattern_idx[keep % num_pats],
+                }
+
+            # --- パス展開の実行 ---
+            # 1. 厳密制約で試行
+            children = expand_paths(beam, use_idx, strict_constraints=True)
+
+            # 2. フォールバック：制約緩和
+            if children is None:
+                children = expand_paths(
+                    beam,
+                    np.arange(min(len(patterns['staff_tuples']), fallback_pattern_limit)),
+                    strict_constraints=False,
+                )
+
+            # 3. 最終フォールバック：全員休み
+            if children is None:
+                children = {
+                    'cons': np.zeros_like(beam['cons']),
+                    'offs': beam['offs'] + 1,
+                    'off_cons': beam['off_cons'] + 1,
+                    'weekend_offs': beam['weekend_offs'].copy(),
+                    'scores': beam['scores'] + 1000000,
+                    'parents': beam['nodes'].copy(),
+                    'patterns': np.full(len(beam['scores']), -1, dtype=np.int64),
+                }
+
+            # 同一状態へ収束した子候補の重複除去：状態が完全に一致するパスは
+            # 以降の探索でも同じ子しか生まないため、最小スコアの代表1件だけ残す。
+            # 空いた枠に別状態の候補が入り、同じビーム幅でも探索の多様性が上がる
+            state = np.hstack((
+                children['cons'], children['offs'],
+                children['off_cons'], children['weekend_offs'],
+            ))
+            unique_states, inverse = np.unique(state, axis=0, return_inverse=True)
+            if len(unique_states) < len(inverse):
+                by_group = np.lexsort((np.arange(len(inverse)), children['scores'], inverse))
+                firsts = by_group[np.concatenate(
+                    ([True], inverse[by_group][1:] != inverse[by_group][:-1])
+                )]
+                firsts.sort()  # 同点比較のため生成順へ戻す
+                children = {key: val[firsts] for key, val in children.items()}
+
+            # 上位beam_width件の選抜：全子候補をソートせずO(N)のargpartitionで絞り込み、
+            # 残ったbeam_width件だけをソートする（同点は生成順を保つ安定ソート）
+            child_scores = children['scores']
+            if len(child_scores) > beam_width:
+                top = np.argpartition(child_scores, beam_width - 1)[:beam_width]
+                top.sort()  # argpartitionの並びは不定なので、同点比較用に生成順へ戻す
+                order = top[np.argsort(child_scores[top], kind='stable')]
+            else:
+                order = np.argsort(child_scores, kind='stable')
+
+            # 生き残ったパスだけをジャーナルへ記録し、ノードIDを振り直す
+            first_node = len(node_parents)
+            staff_tuples = patterns['staff_tuples']
+            for parent, pat in zip(children['parents'][order], children['patterns'][order]):
+                node_parents.append(int(parent))
+                node_patterns.append(tuple() if pat < 0 else staff_tuples[pat])
+
+            beam = {
+                'cons': children['cons'][order],
+                'offs': children['offs'][order],
+                'off_cons': children['off_cons'][order],
+                'weekend_offs': children['weekend_offs'][order],
+                'scores': children['scores'][order],
+                'nodes': np.arange(first_node, len(node_parents), dtype=np.int64),
+            }
+
+
+        # ベストパスのノードIDからジャーナルを遡って採用パターン列を復元する
+        node = int(beam['nodes'][0])
+        run_patterns = []
+        while node >= 0:
+            run_patterns.append(node_patterns[node])
+            node = node_parents[node]
+        run_patterns.reverse()
+        return float(beam['scores'][0]), run_patterns
+
+    # === 反復ビーム拡幅 ===
+    # まず調整済みの幅で1本確定させ、時間予算が残っていれば幅を倍々に
+    # 広げて再探索し、最終スコアが改善した場合だけ乗り換える
+    start_time = time.monotonic()
+    first_run = _run_beam(BEAM_WIDTH)
+    if first_run is None:
+        return None
+    best_score, selected_patterns = first_run
+    width = BEAM_WIDTH * 2
+    while width <= BEAM_WIDTH * WIDEN_MAX_FACTOR and time.monotonic() - start_time < WIDEN_TIME_BUDGET:
+        rerun = _run_beam(width)
+        if rerun is None:
+            return None
+        rerun_score, rerun_patterns = rerun
+        if rerun_score < best_score:
+            best_score, selected_patterns = rerun_score, rerun_patterns
+        width *= 2
 
     # --- 進行状況コールバック完了 ---
     if progress_callback:
         progress_callback(num_days, num_days, "計算が完了しました。")
 
     # === 結果のシフト表構築 ===
-    best_path = current_paths[0]
-    selected_patterns = []
-    while best_path and best_path['pattern'] is not None:
-        selected_patterns.append(best_path['pattern'])
-        best_path = best_path['prev']
-    selected_patterns.reverse()
-    sorted_roles_desc = sorted(roles_config, key=lambda r: r.get('priority', 999), reverse=True)
-
     # ヘッダー構築
     top_level = [str(d.day) for d in days_list] + ["勤(休)"]
     bottom_level = [
@@ -412,21 +760,15 @@ def solve_schedule_from_ui(
         working = list(selected_patterns[d]) if d < len(selected_patterns) else []
         working_set = set(working)
         roles = assign_roles_smartly(working, role_map, roles_config=roles_config, staff_df=staff_df)
-        is_insufficient = not can_cover_required_roles(working, role_map, constraints, roles_config=roles_config)
+        is_insufficient = not cached_can_cover(tuple(working))
 
         for s in staff_indices:
             if s in working_set:
                 if s in roles:
                     output_data[s, d] = roles[s]
                 else:
-                    caps = role_map[s]
                     # 優先順位が低い役割から割り当て
-                    fallback_role = '〇'
-                    for role in sorted_roles_desc:
-                        if role['name'] in caps:
-                            fallback_role = role['name']
-                            break
-                    output_data[s, d] = fallback_role
+                    output_data[s, d] = pick_fallback_role(role_map[s], roles_config=roles_config)
             else:
                 output_data[s, d] = '×' if fixed_shifts[s, d] == '×' else '／'
         if is_insufficient:
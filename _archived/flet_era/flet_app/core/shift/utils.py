@@ -1,9 +1,17 @@
 # ユーティリティ関数 — シフト作成ツール
 
 import datetime
+import functools
 import itertools
+import numpy as np
 import pandas as pd
 
+try:
+    import jpholiday
+except ImportError:
+    # jpholidayが無い環境ではフォールバックの祝日リストで判定する
+    jpholiday = None
+
 
 # --- デフォルト役割設定 ---
 DEFAULT_ROLES_CONFIG = [
@@ -23,27 +31,26 @@ FIXED_SYMBOLS = {
 
 
 # --- 祝日判定関数 ---
+# フォールバック用：2026年の祝日セット（jpholidayが無い環境向け）
+_HOLIDAYS_2026 = frozenset([
+    datetime.date(2026, 1, 1), datetime.date(2026, 1, 12),
+    datetime.date(2026, 2, 11), datetime.date(2026, 2, 23),
+    datetime.date(2026, 3, 20), datetime.date(2026, 4, 29),
+    datetime.date(2026, 5, 3), datetime.date(2026, 5, 4),
+    datetime.date(2026, 5, 5), datetime.date(2026, 5, 6),
+    datetime.date(2026, 7, 20), datetime.date(2026, 8, 11),
+    datetime.date(2026, 9, 21), datetime.date(2026, 9, 22),
+    datetime.date(2026, 9, 23), datetime.date(2026, 10, 12),
+    datetime.date(2026, 11, 3), datetime.date(2026, 11, 23)
+])
+
+
+@functools.lru_cache(maxsize=512)
 def is_holiday(d):
-    """日付が祝日かどうかを判定する"""
-    try:
-        import jpholiday
-        if jpholiday.is_holiday(d):
-            return True
-    except ImportError:
-        pass
-    # フォールバック用：2026年の祝日リスト
-    holidays_2026 = [
-        datetime.date(2026, 1, 1), datetime.date(2026, 1, 12),
-        datetime.date(2026, 2, 11), datetime.date(2026, 2, 23),
-        datetime.date(2026, 3, 20), datetime.date(2026, 4, 29),
-        datetime.date(2026, 5, 3), datetime.date(2026, 5, 4),
-        datetime.date(2026, 5, 5), datetime.date(2026, 5, 6),
-        datetime.date(2026, 7, 20), datetime.date(2026, 8, 11),
-        datetime.date(2026, 9, 21), datetime.date(2026, 9, 22),
-        datetime.date(2026, 9, 23), datetime.date(2026, 10, 12),
-        datetime.date(2026, 11, 3), datetime.date(2026, 11, 23)
-    ]
-    return d in holidays_2026
+    """日付が祝日かどうかを判定する（日付ごとに結果をキャッシュ）"""
+    if jpholiday is not None and jpholiday.is_holiday(d):
+        return True
+    return d in _HOLIDAYS_2026
 
 
 # --- 役割名の内部キー変換 ---
@@ -62,25 +69,67 @@ def get_role_map_from_df(staff_df, roles_config=None):
     if roles_config is None:
         roles_config = DEFAULT_ROLES_CONFIG
     
-    role_map = {}
+    # 列の読み出しと真偽判定はビットマスク版（get_role_masks_from_df）に
+    # 一本化し、ここではマスクをほどいてセット表現に戻すだけにする
+    cap_names = [r["name"] for r in roles_config] + ["Night", "Morning"]
+    masks = get_role_masks_from_df(staff_df, roles_config=roles_config)
+    return {
+        i: {name for bit_index, name in enumerate(cap_names) if mask >> bit_index & 1}
+        for i, mask in enumerate(masks)
+    }
+
+
+def get_role_vectors_from_df(staff_df, roles_config=None):
+    """スタッフDataFrameから、能力名→スタッフ軸ブール配列の対応を生成する
+
+    キーは動的役割名と"Night"/"Morning"。各配列のインデックスsが
+    `name in role_map[s]` と同じ真偽を持つSoA表現で、スタッフ全員に
+    対する能力判定を1回の配列参照で済ませたい呼び出し側向け。
+    """
+    if roles_config is None:
+        roles_config = DEFAULT_ROLES_CONFIG
+    cap_names = [r["name"] for r in roles_config] + ["Night", "Morning"]
+    masks = get_role_masks_from_df(staff_df, roles_config=roles_config)
+    return {
+        name: ((masks >> bit) & 1).astype(np.bool_)
+        for bit, name in enumerate(cap_names)
+    }
+
+
+def get_role_masks_from_df(staff_df, roles_config=None):
+    """スタッフDataFrameから、各スタッフの役割能力をビットマスク配列として生成する
+
+    戻り値は長さlen(staff_df)の整数配列。ビット配置は
+    roles_configの並び順で動的役割がビット0..R-1、続いて
+    ビットRが夜可（Night）、ビットR+1が朝可（Morning）。
+    通常の役割数（上限10＋固定属性2つ）はuint16に収まるが、
+    役割設定はユーザー入力で上限がないため、必要ビット数に応じて
+    格納型を広げる（64ビット超はPython整数のobject配列）。
+    列の真偽判定はget_role_map_from_dfと同じくPythonの真理値に従う。
+    """
+    if roles_config is None:
+        roles_config = DEFAULT_ROLES_CONFIG
+
     df = staff_df.reset_index(drop=True)
-    
-    # 動的に設定された役割名のリストを取得
     role_names = [r["name"] for r in roles_config]
-    
-    for i, row in df.iterrows():
-        roles = set()
-        # 動的役割のチェック
-        for rname in role_names:
-            if rname in df.columns and row.get(rname, False):
-                roles.add(rname)
-        # 固定属性（朝可/夜可）は常にチェック
-        if "夜可" in df.columns and row.get("夜可", False):
-            roles.add("Night")
-        if "朝可" in df.columns and row.get("朝可", False):
-            roles.add("Morning")
-        role_map[i] = roles
-    return role_map
+    columns = role_names + ["夜可", "朝可"]
+
+    if len(columns) <= 16:
+        dtype = np.uint16
+    elif len(columns) <= 32:
+        dtype = np.uint32
+    elif len(columns) <= 64:
+        dtype = np.uint64
+    else:
+        dtype = object
+
+    masks = np.zeros(len(df), dtype=dtype)
+    for bit_index, col in enumerate(columns):
+        if col in df.columns:
+            flags = df[col].astype(bool).to_numpy()
+            bit = 1 << bit_index if dtype is object else dtype(1 << bit_index)
+            masks[flags] |= bit
+    return masks
 
 
 # --- 役割カバー判定（動的対応） ---
@@ -92,22 +141,71 @@ def can_cover_required_roles(staff_list, role_map, constraints, roles_config=Non
     if roles_config is None:
         roles_config = DEFAULT_ROLES_CONFIG
     
-    # 朝/夜の最低人数チェック（固定属性）
-    if sum(1 for s in staff_list if "Night" in role_map[s]) < constraints.get('min_night', 3):
+    # 各役割の必要人数を合計して、最低必要人数を計算
+    total_min = sum(r.get("min_per_day", 1) for r in roles_config)
+    if len(staff_list) < total_min:
         return False
-    if sum(1 for s in staff_list if "Morning" in role_map[s]) < constraints.get('min_morning', 3):
+
+    # スタッフ1人につき1回だけ役割セットを走査し、
+    # 夜可・朝可・各役割のメンバーをビットマスク（スタッフjがビットj）へまとめる
+    role_names = [r["name"] for r in roles_config]
+    night_mask = 0
+    morning_mask = 0
+    role_member_masks = [0] * len(role_names)
+    for j, s in enumerate(staff_list):
+        caps = role_map[s]
+        bit = 1 << j
+        if "Night" in caps:
+            night_mask |= bit
+        if "Morning" in caps:
+            morning_mask |= bit
+        for ri, rname in enumerate(role_names):
+            if rname in caps:
+                role_member_masks[ri] |= bit
+
+    # 朝/夜の最低人数チェック（固定属性・popcountで数える）
+    if night_mask.bit_count() < constraints.get('min_night', 3):
+        return False
+    if morning_mask.bit_count() < constraints.get('min_morning', 3):
         return False
 
-    # 各役割の必要人数チェック（貪欲法で割り当て可能かを確認）
-    # 優先順位順にソートして、高優先の役割から割り当て
+    if len(roles_config) <= 10:
+        # 各役割の必要人数チェック（Hallの定理による厳密判定）
+        # 役割の任意の部分集合Sについて、Sのどれかを担当できるスタッフ数が
+        # Sの必要人数合計以上であれば（かつそのときに限り）割り当てが存在する。
+        # 役割数R（通常4）に対して2^R回のビット演算で済む
+        masks = role_member_masks
+        needs = [r.get("min_per_day", 1) for r in roles_config]
+        num_roles = len(masks)
+        # 全役割の累積OR（＝どれかの役割を担えるスタッフ）を先に1回だけ検査する。
+        # 部分集合列挙の最終回と同じ条件だが、典型的な不成立（役割要員そのものの
+        # 不足）をO(R)で弾けるため、2^R回のループに入る前の前置フィルタとして置く
+        covered = 0
+        for mask in masks:
+            covered |= mask
+        if covered.bit_count() < sum(needs):
+            return False
+        # 次に単一役割の人数をO(R)で検査し、列挙本体では2役割以上の組だけを
+        # 調べる（安い順・通りやすい順にフィルタを重ねるfail-fast構成）
+        for r in range(num_roles):
+            if masks[r].bit_count() < needs[r]:
+                return False
+        for subset in range(1, 1 << num_roles):
+            if not subset & (subset - 1):
+                continue  # 単一役割の部分集合は検査済み
+            union = 0
+            required = 0
+            for r in range(num_roles):
+                if subset >> r & 1:
+                    union |= masks[r]
+                    required += needs[r]
+            if union.bit_count() < required:
+                return False
+        return True
+
+    # 役割数が極端に多い設定では部分集合列挙を避け、従来の貪欲チェックに戻す
+    # （近似判定：高優先の役割から割り当て可能かだけを確認）
     sorted_roles = sorted(roles_config, key=lambda r: r.get("priority", 999))
-    
-    # 各役割の必要人数を合計して、最低必要人数を計算
-    total_min = sum(r.get("min_per_day", 1) for r in sorted_roles)
-    if len(staff_list) < total_min:
-        return False
-    
-    # 各役割に対して担当可能なスタッフがいるかチェック
     assigned = set()
     for role in sorted_roles:
         rname = role["name"]
@@ -115,32 +213,121 @@ def can_cover_required_roles(staff_list, role_map, constraints, roles_config=Non
         candidates = [s for s in staff_list if s not in assigned and rname in role_map[s]]
         if len(candidates) < needed:
             return False
-        # 貪欲に割り当て（他の役割との兼ね合いがあるので、ここでは可能性チェックのみ）
-        # より正確なチェックはpermutationsで行うが、パフォーマンスのため簡易判定
         for c in candidates[:needed]:
             assigned.add(c)
-    
+
     return True
 
 
 # --- 出勤パターン生成（動的対応） ---
-def get_possible_day_patterns(available_staff, roles_config=None):
-    """出勤可能なスタッフから、最低人数〜最大人数の出勤組み合わせを生成する"""
+def _iter_patterns(available_staff, sizes):
+    """指定サイズ順に出勤組み合わせを遅延列挙するジェネレータ"""
+    for size in sizes:
+        yield from itertools.combinations(available_staff, size)
+
+
+# 列挙結果のキャッシュ（同じ出勤可能メンバー構成の日は組み合わせを再利用する）。
+# 1エントリが数百タプルになり得るため、上限を超えたら古い順に追い出す
+_pattern_cache = {}
+_PATTERN_CACHE_MAX = 256
+
+
+def get_possible_day_patterns(available_staff, roles_config=None, target_size=None, max_patterns=None):
+    """出勤可能なスタッフから、最低人数〜最大人数の出勤組み合わせを生成する
+
+    target_size: その日の目標出勤人数。指定すると目標に近い人数から列挙し、
+        max_patternsで打ち切る際に有望なサイズが優先的に残る。
+    max_patterns: 生成数の上限。スタッフ数が多い日でも組み合わせ爆発を防ぐ。
+
+    結果は引数一式をキーにキャッシュされる。呼び出し側が自由に
+    シャッフル・フィルタできるよう、返すのは毎回新しいリスト。
+    """
     if roles_config is None:
         roles_config = DEFAULT_ROLES_CONFIG
-    
-    # 最低人数 = 全役割の必要人数の合計
-    min_staff = sum(r.get("min_per_day", 1) for r in roles_config)
-    min_staff = max(min_staff, 2)  # 最低2人は必要
-    
-    return [
-        subset
-        for size in range(min_staff, min(len(available_staff) + 1, 10))
-        for subset in itertools.combinations(available_staff, size)
-    ]
+
+    # available_staffの並びは列挙順に影響するため、ソートせずそのままキーにする
+    cache_key = (
+        tuple(available_staff),
+        tuple((r["name"], r.get("min_per_day", 1)) for r in roles_config),
+        target_size,
+        max_patterns,
+    )
+    cached = _pattern_cache.get(cache_key)
+    if cached is None:
+        # 最低人数 = 全役割の必要人数の合計
+        min_staff = sum(r.get("min_per_day", 1) for r in roles_config)
+        min_staff = max(min_staff, 2)  # 最低2人は必要
+
+        # サイズ上限10はO(C(n,k))爆発に対する防火壁（外さないこと）
+        sizes = list(range(min_staff, min(len(available_staff) + 1, 10)))
+        if target_size is not None:
+            # 目標人数に近いサイズから列挙する（打ち切り時の優先順位）
+            sizes.sort(key=lambda k: abs(k - target_size))
+
+        # 全組み合わせを先に実体化せず、上限までの遅延列挙で切り出す
+        patterns = list(itertools.islice(_iter_patterns(available_staff, sizes), max_patterns))
+        if target_size is not None and (max_patterns is None or len(patterns) < max_patterns):
+            # 上限に達しなかった場合は従来どおり人数昇順の並びで返す（安定ソート）
+            patterns.sort(key=len)
+        # 挿入順＝古い順（dictは挿入順を保持）でFIFO追い出しする
+        while len(_pattern_cache) >= _PATTERN_CACHE_MAX:
+            _pattern_cache.pop(next(iter(_pattern_cache)))
+        _pattern_cache[cache_key] = cached = tuple(patterns)
+    return list(cached)
 
 
 # --- 役割自動割り当て（動的対応） ---
+# 役割設定ごとの「能力マスク→フォールバック役割」対応表キャッシュ。
+# 優先順位ソートと線形探索を呼び出しのたびに繰り返さず、
+# 2^R通りのマスク全てについて答えをインポート後1回だけ計算しておく
+_fallback_table_cache = {}
+
+
+def _get_fallback_table(roles_config):
+    """(役割名タプル, マスク→役割名の対応表) を返す（役割数>10は表なし）"""
+    key = tuple((r["name"], r.get("priority", 999)) for r in roles_config)
+    entry = _fallback_table_cache.get(key)
+    if entry is None:
+        names = tuple(r["name"] for r in roles_config)
+        if len(names) <= 10:
+            # 優先順位の低い順に並べ、各マスクで最初に立っているビットの役割を引く
+            desc_names = [
+                r["name"]
+                for r in reversed(sorted(roles_config, key=lambda r: r.get("priority", 999)))
+            ]
+            index_of = {name: i for i, name in enumerate(names)}
+            table = [
+                next((n for n in desc_names if mask >> index_of[n] & 1), '〇')
+                for mask in range(1 << len(names))
+            ]
+        else:
+            table = None
+        _fallback_table_cache[key] = entry = (names, table)
+    return entry
+
+
+def pick_fallback_role(caps, roles_config=None):
+    """担当できる役割のうち優先順位が最も低いものを返す（なければ'〇'）
+
+    最低人数が埋まった後の追加出勤者向け。高優先の役割を温存するため、
+    低優先の役割から充てる。
+    """
+    if roles_config is None:
+        roles_config = DEFAULT_ROLES_CONFIG
+    names, table = _get_fallback_table(roles_config)
+    if table is not None:
+        mask = 0
+        for i, rname in enumerate(names):
+            if rname in caps:
+                mask |= 1 << i
+        return table[mask]
+    # 役割数が極端に多い設定では表を持たず従来どおり線形探索する
+    for role in reversed(sorted(roles_config, key=lambda r: r.get("priority", 999))):
+        if role["name"] in caps:
+            return role["name"]
+    return '〇'
+
+
 def assign_roles_smartly(working_indices, role_map, roles_config=None, staff_df=None):
     """出勤メンバーに対して役割を優先順位に基づいて最適に割り当てる
     
@@ -165,11 +352,12 @@ def assign_roles_smartly(working_indices, role_map, roles_config=None, staff_df=
     assigned = set()
     
     # 優先役割が設定されているスタッフを優先割り当て
+    # （ラベル参照の .at をループ内で繰り返さず、列を配列として一度だけ取り出す）
     if staff_df is not None and "優先役割" in staff_df.columns:
-        df_reset = staff_df.reset_index(drop=True)
+        pref_arr = staff_df["優先役割"].to_numpy()
         for s in pool:
-            if s < len(df_reset):
-                pref = df_reset.at[s, "優先役割"]
+            if s < len(pref_arr):
+                pref = pref_arr[s]
                 if pd.notna(pref) and pref != "" and pref != "なし":
                     if pref in role_demand and role_demand[pref] > 0 and pref in role_map[s]:
                         assignments[s] = pref
@@ -178,103 +366,175 @@ def assign_roles_smartly(working_indices, role_map, roles_config=None, staff_df=
     
     # --- フェーズ2: 残りを優先順位順で割り当て ---
     remaining = [s for s in pool if s not in assigned]
-    
-    # まず、各役割の最低人数を満たす割り当てを試みる
-    for role in sorted_roles:
-        rname = role["name"]
-        needed = role_demand.get(rname, 0)
-        if needed <= 0:
-            continue
-        
-        # この役割ができる未割り当てスタッフを見つける
-        candidates = [s for s in remaining if rname in role_map[s]]
-        
-        # 「この役割しかできない（or 選択肢が少ない）」スタッフを優先
-        # → 他の役割の候補数が少ない順にソート
-        def versatility_score(s):
-            return sum(1 for r in role_names if r in role_map[s])
-        candidates.sort(key=versatility_score)
-        
-        for c in candidates[:needed]:
-            assignments[c] = rname
-            assigned.add(c)
-            remaining.remove(c)
-            role_demand[rname] -= 1
-    
+
+    # 「この役割しかできない（or 選択肢が少ない）」スタッフを優先
+    # → 他の役割の候補数が少ない順に探索する
+    def versatility_score(s):
+        return sum(1 for r in role_names if r in role_map[s])
+
+    candidate_order = sorted(remaining, key=versatility_score)
+
+    # 各役割の最低人数スロットを優先順位順に並べ、増強路法（Kuhn法）で
+    # マッチングする。貪欲法と違い、途中で潰しの利くスタッフを取り合っても
+    # 再割り当てで解消されるため、割り当て可能なら必ず全スロットが埋まる
+    slot_roles = [
+        role["name"]
+        for role in sorted_roles
+        for _ in range(role_demand.get(role["name"], 0))
+    ]
+    staff_slot = {}  # スタッフ → 担当スロット番号
+
+    def _augment(slot_idx, visited):
+        rname = slot_roles[slot_idx]
+        for s in candidate_order:
+            if s in visited or rname not in role_map[s]:
+                continue
+            visited.add(s)
+            if s not in staff_slot or _augment(staff_slot[s], visited):
+                staff_slot[s] = slot_idx
+                return True
+        return False
+
+    for slot_idx in range(len(slot_roles)):
+        _augment(slot_idx, set())
+
+    for s, slot_idx in staff_slot.items():
+        rname = slot_roles[slot_idx]
+        assignments[s] = rname
+        assigned.add(s)
+        role_demand[rname] -= 1
+
+    # リストのremove（1回あたりO(n)の走査）を繰り返さず、
+    # 割り当て済み集合との差分として元の並び順のまま作り直す
+    remaining = [s for s in remaining if s not in assigned]
+
     # --- フェーズ3: 余ったスタッフに追加役割 or 〇を割り当て ---
     for s in remaining:
-        caps = role_map[s]
-        # 何か役割ができる場合は、優先順位が低い役割から追加割り当て
-        assigned_extra = False
-        for role in reversed(sorted_roles):
-            rname = role["name"]
-            if rname in caps:
-                assignments[s] = rname
-                assigned_extra = True
-                break
-        if not assigned_extra:
-            # どの役割もできない場合は通常勤務
-            assignments[s] = '〇'
-    
+        assignments[s] = pick_fallback_role(role_map[s], roles_config=roles_config)
+
     return assignments
 
 
 # --- カラーリングロジック（動的対応） ---
+# 固定記号のスタイル文字列はモジュール読み込み時に一度だけ組み立てる
+_FIXED_VALUE_STYLES = {
+    val: (
+        f'background-color: {sym["color"]}; color: {sym["text_color"]};'
+        + (' font-weight: bold;' if val == '※' else '')
+    )
+    for val, sym in FIXED_SYMBOLS.items()
+}
+
+# 役割設定ごとの値→スタイル対応表キャッシュ（設定は描画のたびに同じことが多い）
+_value_style_cache = {}
+
+
+def _get_value_styles(roles_config):
+    """固定記号＋動的役割をまとめた値→スタイル文字列の対応表を返す"""
+    key = tuple(
+        (r["name"], r.get("color", "#e8deef"), r.get("text_color", "#333"))
+        for r in roles_config
+    )
+    table = _value_style_cache.get(key)
+    if table is None:
+        table = dict(_FIXED_VALUE_STYLES)
+        for rname, bg, text in key:
+            table[rname] = f'background-color: {bg}; color: {text};'
+        _value_style_cache[key] = table
+    return table
+
+
 def highlight_cells(data, roles_config=None):
     """シフト表のセルに役割・曜日に応じた背景色を適用する（やわらかいパステル調）"""
     if roles_config is None:
         roles_config = DEFAULT_ROLES_CONFIG
-    
-    styles = pd.DataFrame('', index=data.index, columns=data.columns)
-
-    # 動的に役割→色のマップを作成
-    role_color_map = {}
-    for role in roles_config:
-        role_color_map[role["name"]] = {
-            "bg": role.get("color", "#e8deef"),
-            "text": role.get("text_color", "#333")
-        }
-
-    for col in data.columns:
-        week_str = col[1]
-        if week_str == '土':
-            styles[col] = 'background-color: #e8f4fd;'
-        elif week_str in ['日', '祝']:
-            styles[col] = 'background-color: #fce8e8;'
-
-    for r in data.index:
-        for c in data.columns:
-            val = data.at[r, c]
-            # 勤休列のスタイル
-            if c[0] == '勤(休)':
-                styles.at[r, c] += 'font-weight: bold; background-color: #faf8f6;'
-                continue
 
-            # 固定記号のスタイル
-            if val in FIXED_SYMBOLS:
-                sym = FIXED_SYMBOLS[val]
-                style_str = f'background-color: {sym["color"]}; color: {sym["text_color"]};'
-                if val == '※':
-                    style_str += ' font-weight: bold;'
-                styles.at[r, c] += style_str
-            # 動的役割のスタイル
-            elif val in role_color_map:
-                rc = role_color_map[val]
-                styles.at[r, c] += f'background-color: {rc["bg"]}; color: {rc["text"]};'
+    value_styles = _get_value_styles(roles_config)
+
+    # pandasのセル・列単位代入を避け、スタイルは2次元のobject配列上で
+    # 組み立てて最後に一度だけDataFrameへ包む
+
+    # 列ヘッダー下段の曜日コードから、列単位の背景スタイルを一括決定する
+    week = data.columns.get_level_values(1).to_numpy()
+    col_base = np.where(
+        week == '土', 'background-color: #e8f4fd;',
+        np.where(np.isin(week, ('日', '祝')), 'background-color: #fce8e8;', ''),
+    ).astype(object)
+    arr = np.broadcast_to(col_base, data.shape).copy()
+
+    # 値スタイルはセルごとのマップではなく、値の種類（十数個）ごとの
+    # ベクトル比較で該当セルへまとめて連結する
+    values = data.to_numpy()
+    for val, style in value_styles.items():
+        arr[values == val] += style
+
+    # 勤休列は値スタイルを適用せず、太字＋固定背景のみ
+    kin_mask = data.columns.get_level_values(0) == '勤(休)'
+    if kin_mask.any():
+        arr[:, kin_mask] = col_base[kin_mask] + 'font-weight: bold; background-color: #faf8f6;'
+
+    return pd.DataFrame(arr, index=data.index, columns=data.columns)
 
-    return styles
+
+def style_shift_table(data, roles_config=None):
+    """highlight_cellsと同じ配色をCSSクラスで適用したStylerを構築する
+
+    セルごとにインラインのstyle属性を出力する代わりに、セルにはクラス名
+    だけを振り、色定義は表全体で1つの<style>ブロックにまとめる。
+    セル数に比例していたスタイル文字列がクラス定義十数行になるため、
+    大きなシフト表のHTML化（to_html）にはこちらを使う。
+    """
+    if roles_config is None:
+        roles_config = DEFAULT_ROLES_CONFIG
+
+    value_styles = _get_value_styles(roles_config)
+    # 値→クラス名はスタイル表の並び順で機械的に振る（sv0, sv1, ...）
+    value_classes = {val: f'sv{i}' for i, val in enumerate(value_styles)}
+
+    # クラス割り当てはhighlight_cellsと同じ手順：列単位の曜日クラスを敷き、
+    # 値クラスを重ね、勤休列は専用クラスで上書きする
+    week = data.columns.get_level_values(1).to_numpy()
+    col_classes = np.where(
+        week == '土', 'wd-sat ',
+        np.where(np.isin(week, ('日', '祝')), 'wd-sun ', ''),
+    ).astype(object)
+    classes = np.broadcast_to(col_classes, data.shape).copy()
+    values = data.to_numpy()
+    for val, cls in value_classes.items():
+        classes[values == val] += cls
+    kin_mask = data.columns.get_level_values(0) == '勤(休)'
+    if kin_mask.any():
+        classes[:, kin_mask] = col_classes[kin_mask] + 'kin'
+
+    # 定義順で優先度を再現する：曜日 < 値 < 勤休（インライン連結時と同じ勝ち方）
+    table_styles = [
+        {'selector': 'td.wd-sat', 'props': 'background-color: #e8f4fd;'},
+        {'selector': 'td.wd-sun', 'props': 'background-color: #fce8e8;'},
+    ]
+    table_styles += [
+        {'selector': f'td.{cls}', 'props': value_styles[val]}
+        for val, cls in value_classes.items()
+    ]
+    table_styles.append(
+        {'selector': 'td.kin', 'props': 'font-weight: bold; background-color: #faf8f6;'}
+    )
+
+    return data.style.set_td_classes(
+        pd.DataFrame(classes, index=data.index, columns=data.columns)
+    ).set_table_styles(table_styles)
 
 
 # --- デフォルト日付範囲 ---
 def get_default_date_range():
     """デフォルトの日付範囲を計算する（当月26日〜翌月25日）"""
     today = datetime.date.today()
-    if today.day >= 26:
-        start_date = today.replace(day=26)
-    else:
-        start_date = today.replace(day=26)
-    if start_date.month == 12:
-        end_date = start_date.replace(year=start_date.year + 1, month=1, day=25)
-    else:
-        end_date = start_date.replace(month=start_date.month + 1, day=25)
+    # 26日未満は前月26日始まり。月-1を0始まりのdivmodで計算すれば
+    # 1月→前年12月の繰り越しも分岐なしで扱える
+    months_since_epoch = today.year * 12 + (today.month - 1)
+    if today.day < 26:
+        months_since_epoch -= 1
+    start_year, start_month0 = divmod(months_since_epoch, 12)
+    start_date = datetime.date(start_year, start_month0 + 1, 26)
+    end_year, end_month0 = divmod(months_since_epoch + 1, 12)
+    end_date = datetime.date(end_year, end_month0 + 1, 25)
     return start_date, end_date
@@ -80,7 +80,13 @@ def apply_custom_css():
         }
 
         /* ===== 統計カード ===== */
+        .stat-card-row {
+            display: flex;
+            gap: 1rem;
+        }
+
         .stat-card {
+            flex: 1;
             background: white;
             border: 1px solid #e9ecef;
             border-radius: 12px;
@@ -152,9 +158,9 @@ def apply_custom_css():
     """, unsafe_allow_html=True)
 
 
-def show_product_card(product: dict):
-    """商品情報をカード形式で表示"""
-    st.markdown(f"""
+def _product_card_html(product: dict, show_details: bool = False) -> str:
+    """商品カード（必要なら詳細テーブル込み）のHTMLを1つの文字列に組み立てる"""
+    html = f"""
     <div class="product-card">
         <h3>🏷️ {product.get('product_name', '不明')}</h3>
         <div class="price-info">
@@ -163,7 +169,28 @@ def show_product_card(product: dict):
             <span>🏪 売価: ¥{product.get('selling_price', 0):,}</span>
         </div>
     </div>
-    """, unsafe_allow_html=True)
+    """
+    if show_details:
+        rows = [
+            ("JANコード", f"<code>{product.get('jan_code', '-')}</code>"),
+            ("商品名", product.get('product_name', '-')),
+            ("原価", f"¥{product.get('cost_price', 0):,}"),
+            ("売価", f"¥{product.get('selling_price', 0):,}"),
+            ("商品区分", product.get('category', '-') or '-'),
+            ("かけ率", f"{product.get('markup_rate', 0):.2f}"),
+        ]
+        body = "".join(
+            f'<tr><td style="padding:0.3rem 1rem 0.3rem 0; color:#888;">{label}</td>'
+            f'<td style="padding:0.3rem 0;">{value}</td></tr>'
+            for label, value in rows
+        )
+        html += f'<table style="margin:0.5rem 0;">{body}</table>'
+    return html
+
+
+def show_product_card(product: dict, show_details: bool = False):
+    """商品情報をカード形式で表示（show_details=Trueで詳細テーブルもまとめて1回で描画）"""
+    st.markdown(_product_card_html(product, show_details), unsafe_allow_html=True)
 
 
 def show_transfer_item(item: dict, index: int):
@@ -181,13 +208,12 @@ def show_transfer_item(item: dict, index: int):
 
 
 def show_stat_cards(stats: dict):
-    """統計カードを横並びで表示"""
-    cols = st.columns(len(stats))
-    for col, (label, value) in zip(cols, stats.items()):
-        with col:
-            st.markdown(f"""
-            <div class="stat-card">
-                <div class="stat-value">{value}</div>
-                <div class="stat-label">{label}</div>
-            </div>
-            """, unsafe_allow_html=True)
+    """統計カードを横並びで表示（N個のカラムではなく1回のst.markdownで描画）"""
+    cards = "".join(
+        f'<div class="stat-card">'
+        f'<div class="stat-value">{value}</div>'
+        f'<div class="stat-label">{label}</div>'
+        f'</div>'
+        for label, value in stats.items()
+    )
+    st.markdown(f'<div class="stat-card-row">{cards}</div>', unsafe_allow_html=True)
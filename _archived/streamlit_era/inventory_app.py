@@ -10,7 +10,7 @@ Streamlit + Supabase で構築。iPad対応、バーコードリーダー対応
 
 import streamlit as st
 import pandas as pd
-from datetime import datetime, date, timedelta
+from datetime import date, timedelta
 
 # --- ページ設定（必ず最初に呼ぶ） ---
 st.set_page_config(
@@ -22,7 +22,7 @@ st.set_page_config(
 
 from inventory.config import APP_TITLE, PAGES, PAGE_TRANSFER, PAGE_HISTORY, PAGE_PRODUCTS
 from inventory.ui_components import (
-    apply_custom_css, show_product_card, show_transfer_item, show_stat_cards
+    apply_custom_css, show_product_card, show_stat_cards
 )
 from inventory import db
 
@@ -96,8 +96,8 @@ def init_session_state():
     if "last_scanned_product" not in st.session_state:
         st.session_state.last_scanned_product = None
 
-    if "jan_input_key" not in st.session_state:
-        st.session_state.jan_input_key = 0
+    if "jan_clear_pending" not in st.session_state:
+        st.session_state.jan_clear_pending = False
 
 
 init_session_state()
@@ -122,6 +122,12 @@ def refresh_stores():
 if not st.session_state.stores:
     st.session_state.stores = load_stores()
 
+# 店舗の索引を1回だけ構築（以降の名前⇔ID解決はdictルックアップで済ませる）
+stores = st.session_state.stores
+stores_by_id = {s["id"]: s for s in stores}
+stores_by_name = {s["name"]: s for s in stores}
+store_names = list(stores_by_name)
+
 
 # ============================================
 # サイドバー
@@ -132,30 +138,21 @@ with st.sidebar:
 
     # --- 自分の店舗選択 ---
     st.markdown("### 🏪 自分の店舗")
-    stores = st.session_state.stores
-    store_names = [s["name"] for s in stores]
 
     if store_names:
-        # 前回の選択を復元
-        default_idx = 0
-        if st.session_state.current_store_id:
-            for i, s in enumerate(stores):
-                if s["id"] == st.session_state.current_store_id:
-                    default_idx = i
-                    break
+        # 選択状態はウィジェットキー経由でStreamlitが保持するため、
+        # indexを毎回逆算するスキャンは不要
+        st.session_state.setdefault("store_selector", store_names[0])
 
         selected_store_name = st.selectbox(
             "店舗を選択",
             store_names,
-            index=default_idx,
             key="store_selector",
             label_visibility="collapsed"
         )
 
         # 選択した店舗のIDを保存
-        selected_store = next(
-            (s for s in stores if s["name"] == selected_store_name), None
-        )
+        selected_store = stores_by_name.get(selected_store_name)
         if selected_store:
             st.session_state.current_store_id = selected_store["id"]
     else:
@@ -194,9 +191,7 @@ with st.sidebar:
                 key="del_store_select",
                 label_visibility="collapsed"
             )
-            del_store = next(
-                (s for s in stores if s["name"] == del_store_name), None
-            )
+            del_store = stores_by_name.get(del_store_name)
 
             # 確認チェックボックス
             confirm = st.checkbox(
@@ -234,21 +229,21 @@ if page == PAGE_TRANSFER:
         st.stop()
 
     # 移動元の表示
-    from_store = next(
-        (s for s in stores if s["id"] == st.session_state.current_store_id),
-        None
-    )
+    from_store = stores_by_id.get(st.session_state.current_store_id)
     if from_store:
         st.info(f"📍 移動元: **{from_store['name']}**")
 
-    # 移動先の選択
-    to_store_names = [s["name"] for s in stores if s["id"] != st.session_state.current_store_id]
+    # 移動先の選択（自店舗を除く）
+    to_store_names = [
+        name for name, s in stores_by_name.items()
+        if s["id"] != st.session_state.current_store_id
+    ]
     if not to_store_names:
         st.warning("移動先店舗がありません")
         st.stop()
 
     to_store_name = st.selectbox("📍 移動先店舗", to_store_names, key="to_store_select")
-    to_store = next((s for s in stores if s["name"] == to_store_name), None)
+    to_store = stores_by_name.get(to_store_name)
 
     st.divider()
 
@@ -256,10 +251,16 @@ if page == PAGE_TRANSFER:
     st.markdown("### 🔍 商品スキャン")
 
     # バーコードリーダー入力欄
+    # キーを変えてウィジェットを作り直すとReactノードごと再マウントされてしまうため、
+    # 安定キーのまま「次のrerunの冒頭で値をクリアする」方式にする
+    if st.session_state.jan_clear_pending:
+        st.session_state.jan_input = ""
+        st.session_state.jan_clear_pending = False
+
     jan_code = st.text_input(
         "JANコード",
         placeholder="バーコードをスキャンまたは手入力",
-        key=f"jan_input_{st.session_state.jan_input_key}",
+        key="jan_input",
         label_visibility="collapsed"
     )
 
@@ -288,7 +289,7 @@ if page == PAGE_TRANSFER:
                 }
                 st.session_state.transfer_list.append(item)
                 st.session_state.last_scanned_product = None
-                st.session_state.jan_input_key += 1
+                st.session_state.jan_clear_pending = True
                 st.rerun()
         else:
             # 未登録商品 — 手入力で追加できるフォーム
@@ -313,7 +314,7 @@ if page == PAGE_TRANSFER:
                             "to_store_id": to_store["id"] if to_store else None,
                         }
                         st.session_state.transfer_list.append(item)
-                        st.session_state.jan_input_key += 1
+                        st.session_state.jan_clear_pending = True
                         st.rerun()
                     else:
                         st.warning("商品名を入力してください")
@@ -324,7 +325,49 @@ if page == PAGE_TRANSFER:
     st.markdown(f"### 📋 今回の移動リスト（{len(st.session_state.transfer_list)}件）")
 
     if st.session_state.transfer_list:
-        # 合計計算
+        # 1行ずつウィジェットを並べる代わりに、仮想化された1つの編集グリッドで表示する
+        # （行数分のnumber_input/buttonを作らないため、リストが長くても描画が軽い）
+        # 数量はグリッド内で編集、行削除はグリッドの行選択＋Deleteで行う
+        df_transfer = pd.DataFrame(st.session_state.transfer_list)
+        edited_df = st.data_editor(
+            df_transfer,
+            column_config={
+                "product_name": st.column_config.TextColumn("商品名", disabled=True),
+                "jan_code": st.column_config.TextColumn("JAN", disabled=True),
+                "quantity": st.column_config.NumberColumn("数量", min_value=1, step=1),
+                "cost_price": st.column_config.NumberColumn("原価", disabled=True),
+                "selling_price": None,
+                "from_store_id": None,
+                "to_store_id": None,
+            },
+            column_order=["product_name", "jan_code", "quantity", "cost_price"],
+            hide_index=True,
+            num_rows="dynamic",
+            use_container_width=True,
+            key="transfer_editor",
+        )
+
+        # 編集結果をセッション状態へ同期（グリッドで追加された空行は除外）。
+        # 数量セルを空にしただけの行は消さず、編集前の数量（なければ1）へ戻す。
+        # 行を消すのはグリッドの行選択＋Deleteの明示操作だけ
+        prev_quantities = {
+            item["jan_code"]: item["quantity"]
+            for item in st.session_state.transfer_list
+        }
+        st.session_state.transfer_list = [
+            {
+                **row,
+                "quantity": (
+                    int(row["quantity"])
+                    if pd.notna(row.get("quantity"))
+                    else prev_quantities.get(row["jan_code"], 1)
+                ),
+            }
+            for row in edited_df.to_dict("records")
+            if row.get("jan_code")
+        ]
+
+        # 合計計算（編集反映後）
         total_cost = sum(
             item["cost_price"] * item["quantity"]
             for item in st.session_state.transfer_list
@@ -339,38 +382,7 @@ if page == PAGE_TRANSFER:
 
         st.markdown("")
 
-        # 各商品の表示（数量変更可能）
-        for i, item in enumerate(st.session_state.transfer_list):
-            col1, col2, col3 = st.columns([4, 2, 1])
-            with col1:
-                show_transfer_item(item, i)
-            with col2:
-                new_qty = st.number_input(
-                    "数量",
-                    min_value=1,
-                    value=item["quantity"],
-                    step=1,
-                    key=f"qty_{i}",
-                    label_visibility="collapsed"
-                )
-                if new_qty != item["quantity"]:
-                    st.session_state.transfer_list[i]["quantity"] = new_qty
-                    st.rerun()
-            with col3:
-                if st.button("🗑️", key=f"remove_{i}"):
-                    st.session_state.transfer_list.pop(i)
-                    st.rerun()
-
-        st.markdown("")
-
         # --- 登録ボタン ---
-        # 合計を再計算（数量変更後）
-        total_cost = sum(
-            item["cost_price"] * item["quantity"]
-            for item in st.session_state.transfer_list
-        )
-        total_items = sum(item["quantity"] for item in st.session_state.transfer_list)
-
         col_reg, col_clear = st.columns([3, 1])
         with col_reg:
             st.markdown('<div class="big-button">', unsafe_allow_html=True)
@@ -422,20 +434,18 @@ elif page == PAGE_HISTORY:
             key="hist_date_to"
         )
 
+    # フィルター選択肢は両方のドロップダウンで共有する
+    filter_store_options = ("全店舗", *store_names)
+
     col3, col4 = st.columns(2)
     with col3:
-        filter_store_options = ["全店舗"] + [s["name"] for s in stores]
         filter_from = st.selectbox("移動元", filter_store_options, key="hist_from")
     with col4:
         filter_to = st.selectbox("移動先", filter_store_options, key="hist_to")
 
-    # 検索パラメータ
-    from_id = None
-    to_id = None
-    if filter_from != "全店舗":
-        from_id = next((s["id"] for s in stores if s["name"] == filter_from), None)
-    if filter_to != "全店舗":
-        to_id = next((s["id"] for s in stores if s["name"] == filter_to), None)
+    # 検索パラメータ（店舗名→IDは索引dictで解決）
+    from_id = stores_by_name[filter_from]["id"] if filter_from != "全店舗" else None
+    to_id = stores_by_name[filter_to]["id"] if filter_to != "全店舗" else None
 
     # データ取得
     transfers = db.get_transfers(
@@ -465,17 +475,8 @@ elif page == PAGE_HISTORY:
             from_name = t.get("from_store", {}).get("name", "-") if isinstance(t.get("from_store"), dict) else "-"
             to_name = t.get("to_store", {}).get("name", "-") if isinstance(t.get("to_store"), dict) else "-"
 
-            # 日付のフォーマット
-            transfer_date = t.get("transfer_date", "")
-            if transfer_date:
-                try:
-                    dt = datetime.fromisoformat(transfer_date.replace("Z", "+00:00"))
-                    transfer_date = dt.strftime("%Y/%m/%d %H:%M")
-                except (ValueError, AttributeError):
-                    pass
-
             display_data.append({
-                "日付": transfer_date,
+                "日付": t.get("transfer_date", ""),
                 "移動元": from_name,
                 "移動先": to_name,
                 "商品名": t.get("product_name", ""),
@@ -489,6 +490,12 @@ elif page == PAGE_HISTORY:
 
         df = pd.DataFrame(display_data)
 
+        # 日付のフォーマット（1行ずつのfromisoformatではなくpandasの一括パース。
+        # パースできない値は元の文字列のまま残す）
+        parsed = pd.to_datetime(df["日付"], utc=True, errors="coerce", format="ISO8601")
+        formatted = parsed.dt.tz_convert("Asia/Tokyo").dt.strftime("%Y/%m/%d %H:%M")
+        df["日付"] = formatted.where(parsed.notna(), df["日付"])
+
         # テーブル表示（IDカラムは非表示）
         st.dataframe(
             df.drop(columns=["_id"]),
@@ -613,17 +620,8 @@ elif page == PAGE_PRODUCTS:
     if search_jan:
         product = db.search_product_by_jan(search_jan.strip())
         if product:
-            show_product_card(product)
-            st.markdown(f"""
-            | 項目 | 値 |
-            |------|------|
-            | JANコード | `{product.get('jan_code', '-')}` |
-            | 商品名 | {product.get('product_name', '-')} |
-            | 原価 | ¥{product.get('cost_price', 0):,} |
-            | 売価 | ¥{product.get('selling_price', 0):,} |
-            | 商品区分 | {product.get('category', '-')} |
-            | かけ率 | {product.get('markup_rate', 0):.2f} |
-            """)
+            # カードと詳細テーブルを1回のst.markdownでまとめて描画
+            show_product_card(product, show_details=True)
 
             # 削除機能（確認付き）
             del_confirm = st.checkbox(
@@ -651,7 +649,9 @@ elif page == PAGE_PRODUCTS:
     products = db.get_all_products(limit=100)
 
     if products:
-        df_products = pd.DataFrame(products)
+        # Arrowバックエンドで構築（StreamlitのwireプロトコルがArrowのため、
+        # object型の文字列カラムよりメモリ・転送量ともに軽い）
+        df_products = pd.DataFrame(products).convert_dtypes(dtype_backend="pyarrow")
 
         # 表示用カラム選択
         display_cols = {
@@ -662,7 +662,8 @@ elif page == PAGE_PRODUCTS:
             "category": "区分",
         }
 
-        available_cols = [c for c in display_cols.keys() if c in df_products.columns]
+        existing_cols = set(df_products.columns)
+        available_cols = [c for c in display_cols if c in existing_cols]
         df_display = df_products[available_cols].rename(columns=display_cols)
 
         st.dataframe(df_display, use_container_width=True, hide_index=True)
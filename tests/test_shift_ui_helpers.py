@@ -1,5 +1,7 @@
 import json
+import random
 import unittest
+from datetime import date, timedelta
 from pathlib import Path
 from uuid import uuid4
 from unittest.mock import patch
@@ -17,11 +19,17 @@ from flet_app.core.shift.data_io import (
     load_shift_history_list,
     save_shift_history,
 )
+from flet_app.core.shift import solver as shift_solver
 from flet_app.core.shift.solver import (
     _select_beam_width,
     _select_pattern_limits,
     solve_schedule_from_ui,
 )
+from flet_app.core.shift.utils import (
+    DEFAULT_ROLES_CONFIG,
+    can_cover_required_roles,
+    get_default_date_range,
+)
 from flet_app.pages.shift import ShiftState
 
 
@@ -152,6 +160,39 @@ class ShiftStoreBootstrapTests(unittest.TestCase):
         self.assertEqual(stores, [DEFAULT_STORE_NAME])
 
 
+class ShiftDateRangeTests(unittest.TestCase):
+    def _range_for_today(self, today):
+        class _FixedDate(date):
+            @classmethod
+            def today(cls):
+                return today
+
+        with patch("flet_app.core.shift.utils.datetime.date", _FixedDate):
+            return get_default_date_range()
+
+    def test_range_rolls_back_to_previous_month_before_the_26th(self):
+        self.assertEqual(
+            self._range_for_today(date(2026, 3, 10)),
+            (date(2026, 2, 26), date(2026, 3, 25)),
+        )
+
+    def test_range_starts_in_current_month_on_and_after_the_26th(self):
+        self.assertEqual(
+            self._range_for_today(date(2026, 3, 26)),
+            (date(2026, 3, 26), date(2026, 4, 25)),
+        )
+
+    def test_range_wraps_year_boundaries(self):
+        self.assertEqual(
+            self._range_for_today(date(2026, 1, 5)),
+            (date(2025, 12, 26), date(2026, 1, 25)),
+        )
+        self.assertEqual(
+            self._range_for_today(date(2025, 12, 26)),
+            (date(2025, 12, 26), date(2026, 1, 25)),
+        )
+
+
 class ShiftSolverCancelTests(unittest.TestCase):
     def test_solver_returns_none_when_progress_callback_requests_cancel(self):
         staff_df, holidays_df, required_work_df = get_default_data()
@@ -168,6 +209,89 @@ class ShiftSolverCancelTests(unittest.TestCase):
         self.assertIsNone(result)
 
 
+class ShiftRoleCoverTests(unittest.TestCase):
+    @staticmethod
+    def _brute_force_can_cover(staff_list, role_map, constraints, roles_config):
+        """小規模な総当たり割り当てによる充足可否のオラクル"""
+        total_min = sum(r.get("min_per_day", 1) for r in roles_config)
+        if len(staff_list) < total_min:
+            return False
+        if sum(1 for s in staff_list if "Night" in role_map[s]) < constraints.get("min_night", 3):
+            return False
+        if sum(1 for s in staff_list if "Morning" in role_map[s]) < constraints.get("min_morning", 3):
+            return False
+        slots = [r["name"] for r in roles_config for _ in range(r.get("min_per_day", 1))]
+
+        def assign(slot_idx, used):
+            if slot_idx == len(slots):
+                return True
+            for s in staff_list:
+                if s not in used and slots[slot_idx] in role_map[s]:
+                    used.add(s)
+                    if assign(slot_idx + 1, used):
+                        return True
+                    used.discard(s)
+            return False
+
+        return assign(0, set())
+
+    def test_hall_condition_matches_brute_force_assignment_oracle(self):
+        rng = random.Random(0)
+
+        for _ in range(300):
+            num_staff = rng.randint(2, 8)
+            role_map = {}
+            for s in range(num_staff):
+                caps = {r["name"] for r in DEFAULT_ROLES_CONFIG if rng.random() < 0.5}
+                if rng.random() < 0.6:
+                    caps.add("Night")
+                if rng.random() < 0.6:
+                    caps.add("Morning")
+                role_map[s] = caps
+            constraints = {
+                "min_night": rng.randint(0, 2),
+                "min_morning": rng.randint(0, 2),
+            }
+            staff_list = tuple(range(num_staff))
+
+            self.assertEqual(
+                can_cover_required_roles(staff_list, role_map, constraints),
+                self._brute_force_can_cover(
+                    staff_list, role_map, constraints, DEFAULT_ROLES_CONFIG
+                ),
+                (role_map, constraints),
+            )
+
+
+class ShiftSolverKernelEquivalenceTests(unittest.TestCase):
+    @unittest.skipUnless(
+        shift_solver._expand_day_kernel is not None,
+        "numba未導入の環境ではNumPyフォールバックのみが使われる",
+    )
+    def test_numba_kernel_and_numpy_fallback_produce_identical_schedules(self):
+        staff_df, holidays_df, required_work_df = get_default_data()
+        days_list = [date(2026, 3, 1) + timedelta(days=i) for i in range(7)]
+
+        def solve():
+            # パターン列挙のシャッフルを両ランで揃える
+            random.seed(2026)
+            return solve_schedule_from_ui(
+                staff_df=staff_df,
+                holidays_df=holidays_df,
+                days_list=days_list,
+                constraints={"min_morning": 3, "min_night": 3, "weekday_targets": {}},
+                required_work_df=required_work_df,
+            )
+
+        # 経過時間依存のビーム幅拡大を止め、両ランを決定的にする
+        with patch("flet_app.core.shift.solver.WIDEN_TIME_BUDGET", 0.0):
+            with_kernel = solve()
+            with patch("flet_app.core.shift.solver._expand_day_kernel", None):
+                numpy_only = solve()
+
+        pd.testing.assert_frame_equal(with_kernel, numpy_only)
+
+
 class ShiftSolverTuningTests(unittest.TestCase):
     def test_solver_uses_smaller_search_width_for_large_monthly_runs(self):
         self.assertLess(_select_beam_width(7, 31), _select_beam_width(7, 5))